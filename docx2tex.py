@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
 # File: doc2tex.py
-# Version: 1.6 2024-10-23
-# Copyright 2024-2025 Jasper Habicht (mail(at)jasperhabicht.de).
+# Version: 2.0 2026-10-14
+# Copyright 2024-2026 Jasper Habicht (mail(at)jasperhabicht.de).
 #
 # This work may be distributed and/or modified under the
 # conditions of the LaTeX Project Public License version 1.3c,
@@ -14,31 +14,152 @@
 # This work has the LPPL maintenance status `maintained'.
 
 '''Convert a .docx file with an ZChinR article to its semantical .tex equivalent.'''
+import itertools
+import os
 import re
 import sys
 import zipfile
+import xml.etree.ElementTree as etree
+from concurrent.futures import ProcessPoolExecutor
 
-bold_styles = []
-italic_styles = []
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+bold_styles = set()
+italic_styles = set()
 section_styles = {}
 list_styles = {}
+paragraph_styles = {}
+footnote_nodes = {}
+
+_EMPH_RUN_RE = re.compile(r'\\emph\{[^{}]*\}(?:[ \t\f]*\\emph\{[^{}]*\})+')
+_EMPH_JOIN_RE = re.compile(r'\}([ \t\f]*)\\emph\{')
+_TEXTBF_RUN_RE = re.compile(r'\\textbf\{[^{}]*\}(?:[ \t\f]*\\textbf\{[^{}]*\})+')
+_TEXTBF_JOIN_RE = re.compile(r'\}([ \t\f]*)\\textbf\{')
+_ESCAPES = {
+    '$': '\\$',
+    '#': '\\#',
+    '&': '\\&',
+    '%': '\\%'
+}
+_URL_RE = re.compile(r'<?((www\.[-a-zA-Z\d]+\.[^\s]+\/|http:\/\/|https:\/\/)[^\s>]+)>?')
+_URL_DOMAIN_RE = re.compile(r'<([-a-zA-Z\d]+\.([a-z]{2}|com|org|net|info))>')
+_NESTED_EMPH_RE = re.compile(r'\\emph\{\\emph\{(.*?)\}(\s*)\}')
+_NESTED_TEXTBF_RE = re.compile(r'\\textbf\{\\textbf\{(.*?)\}(\s*)\}')
+_WRAPPED_FOOTNOTE_RE = re.compile(r'\\(emph|textbf)\{\\footnote\{(.*?)\}(\s*)\}')
+_EMPTY_WRAP_RE = re.compile(r'\\(emph|textbf)\{\s*\}')
+_WRAP_TRAILING_SPACE_RE = re.compile(r'\\(emph|textbf)\{(.*?)\s+\}')
+_WRAP_LEADING_SPACE_RE = re.compile(r'\\(emph|textbf)\{\s+(.*?)\}')
+_FOOTNOTE_TRAILING_SPACE_RE = re.compile(r'\\footnote\{(.*?)\s+\}')
+_FOOTNOTE_LEADING_SPACE_RE = re.compile(r'\\footnote\{\s+(.*?)\}')
+_ENDASH_RE = re.compile(r'(?<![-\d])(\d+)-(\d+)(?![-\d])')
+_SPACED_DASH_RE = re.compile(r'[^\S\n]\-[^\S\n]')
+_ABBR_THREE_RE = re.compile(r'\b([a-zA-Z])\.([a-zA-Z])\.([a-zA-Z])\.')
+_ABBR_TWO_RE = re.compile(r'\b([a-zA-Z])\.([a-zA-Z]{1,2})\.')
+_NUMBER_PERCENT_RE = re.compile(r'(\d)%')
+_NBSP_RE = re.compile(r'(§§?|Artt?\.|Abs\.|Bd\.|Vol\.|S\.|pp?\.|Nr\.|No\.|Fn\.|Rn\.|Sec\.|sec\.|lit\.)[^\S\n](\d+)(?:[^\S\n](ff?\.))?')
+_CELLSEP_RE = re.compile(r'\s+<zchinr:cellsep\/>')
+_ROWSEP_RE = re.compile(r'\s+<zchinr:rowsep\/>')
+_BLANK_CHUNK_RE = re.compile(r'(\s|\\(emph|textbf)\{|\})*')
+_ITEMS_RE = re.compile(r'((?:<zchinr:item>.*?<\/zchinr:item>\s*)++)')
+_ITEM_RE = re.compile(r'<zchinr:item>(.*?)<\/zchinr:item>\n*')
+_QUOTE_DIGRAPHS = {
+    '\u201c\u2018': '``{\\kern0pt}`',
+    '\u2018\u201c': '`{\\kern0pt}``',
+    '\u201d\u2019': "''{\\kern0pt}'",
+    '\u2019\u201d': "'{\\kern0pt}''",
+    '\u201e\u201a': ',,{\\kern0pt},',
+    '\u201a\u201e': ',{\\kern0pt},,'
+}
+_TYPOGRAPHY = {
+    '\u00a0': '~',
+    '\u201c': '``',
+    '\u201d': "''",
+    '\u201e': ',,',
+    '\u2018': '`',
+    '\u2019': "'",
+    '\u201a': ',',
+    '\u2026': '\\ldots{}',
+    '...': '\\ldots{}',
+    '\u2013': '--',
+    '\u2014': '---'
+}
+_PUNCT_QUOTE_RE = re.compile(r'([!?])`')
+_TILDE_NEWLINE_RE = re.compile(r'~\n')
+_NEWLINES_RE = re.compile(r'\n{3,}')
+_TILDE_SPACE_RE = re.compile(r'~[ \t\f]')
+_SPACE_TILDE_RE = re.compile(r'[ \t\f]~')
+_CJK_RE = re.compile(r'([\u3000-\u303F\u4e00-\u9fff\uFF00-\uFFEF]+)')
+_DOC_TEXTBF_RE = re.compile(r'^\\textbf\{(.*?)\}', re.M)
+_DOC_ARTICLE_RE = re.compile(r'^\\zhs\{\u7b2c(.*)\u6761[\u3000\s]', re.M)
+_DOC_PARAGRAPH_RE = re.compile(r'^§~(\d+)\s\[(.*?)\]\s', re.M)
+_NO_STYLE = ('', '', False, ())
+_WRAPPER_TAGS = (f'{W}sdt', f'{W}sdtContent', f'{W}customXml')
+_PARALLEL_SIZE = 2 ** 20
+
+# hierarchy levels of p nodes
+_LEVELS = ('\\section{', '\\subsection{', '\\subsubsection{', '\\paragraph{', '\\subparagraph{')
 
-def get_xmlpart(parent, part):
-    '''Extract XML parts from .docx file.'''
-    with zipfile.ZipFile(parent, 'r') as archive:
-        if zipfile.Path(archive, f'word/{part}.xml').is_file():
-            with archive.open(f'word/{part}.xml', 'r') as part_file:
-                part_file_data = part_file.read()
-            return part_file_data.decode('utf-8')
+def get_xmlpart(archive, part):
+    '''Open XML parts from opened .docx file for streaming.'''
+    try:
+        return archive.open(f'word/{part}.xml', 'r')
+    except KeyError:
+        return False
+
+def find_property(node, name):
+    '''Find the first property of a given name somewhere below a node.'''
+    return next(node.iter(f'{W}{name}'), None)
+
+def has_property(node, name):
+    '''Check whether a toggle property is set somewhere below a node.'''
+    for prop in node.iter(f'{W}{name}'):
+        if prop.get(f'{W}val') not in ('0', 'false', 'off'):
+            return True
     return False
 
+def style_effects(style_id):
+    '''Compute markup and counters a paragraph style adds to a w:p node.'''
+    before = ''
+    after = ''
+    counters = []
+    is_section = style_id in section_styles
+    if is_section:
+        level = section_styles[style_id]
+        before = _LEVELS[int(level)] if level.isdigit() and int(level) < 4 else _LEVELS[-1]
+        after = '}'
+        counters.append('section')
+    if style_id in bold_styles and is_section is False:
+        before += '\\textbf{'
+        after += '}'
+        counters.append('bold')
+    if style_id in italic_styles:
+        before += '\\emph{'
+        after += '}'
+        counters.append('italic')
+    if style_id in list_styles and is_section is False:
+        before = '<zchinr:item>' + before
+        after += '</zchinr:item>'
+        counters.append('list')
+    return before, after, is_section, tuple(counters)
+
+def find_nodes(node, name):
+    '''Find the nodes of a given name below a node, also inside content controls and custom XML, but not inside nested tables.'''
+    result = []
+    for child in node:
+        if child.tag == f'{W}{name}':
+            result.append(child)
+        elif child.tag in _WRAPPER_TAGS:
+            result.extend(find_nodes(child, name))
+    return result
+
 # process structure
 def process_structure(file_name):
     '''Extract styles and footnotes and process docment.'''
-    # read file parts
-    document_data = get_xmlpart(file_name, 'document')
-    footnotes_data = get_xmlpart(file_name, 'footnotes')
-    styles_data = get_xmlpart(file_name, 'styles')
+    # read file parts, opened parts stay readable after the archive is closed
+    with zipfile.ZipFile(file_name, 'r') as archive:
+        document_data = get_xmlpart(archive, 'document')
+        footnotes_data = get_xmlpart(archive, 'footnotes')
+        styles_data = get_xmlpart(archive, 'styles')
     count = {
         'bold': 0,
         'italic': 0,
@@ -49,34 +170,39 @@ def process_structure(file_name):
     }
     # collect styles
     if styles_data:
-        style_ids = re.findall(r'<w:style(\s[^>]+)?\sw:styleId="(.*?)"', styles_data)
-        # identify styles as bold, italic or level
-        for style in style_ids:
-            style_properties = re.search(rf'<w:style(\s[^>]+)?\sw:styleId="{re.escape(style[1])}"(\s[^>]+)?>(.*?)<\/w:style>', styles_data)
-            if re.search(r'<w:b\/>', style_properties[3]):
-                bold_styles.append(style[1])
-            if re.search(r'<w:1\/>', style_properties[3]):
-                italic_styles.append(style[1])
-            if re.search(r'<w:outlineLvl\s.*?\/>', style_properties[3]):
-                section_level = re.search(r'<w:outlineLvl(\s[^>]+)?\sw:val="(.*?)"', style_properties[3])
-                section_styles[style[1]] = section_level[2]
-            if re.search(r'<w:ilvl\s.*?\/>', style_properties[3]):
-                list_level = re.search(r'<w:ilvl(\s[^>]+)?\sw:val="(.*?)"', style_properties[3])
-                list_styles[style[1]] = list_level[2]
-    # collect footnotes
-    footnote_nodes = {}
+        with styles_data:
+            # identify styles as bold, italic or level
+            for _, style in etree.iterparse(styles_data):
+                if style.tag != f'{W}style':
+                    continue
+                style_id = style.get(f'{W}styleId')
+                if has_property(style, 'b'):
+                    bold_styles.add(style_id)
+                if has_property(style, 'i'):
+                    italic_styles.add(style_id)
+                section_level = find_property(style, 'outlineLvl')
+                if section_level is not None:
+                    section_styles[style_id] = section_level.get(f'{W}val', '')
+                list_level = find_property(style, 'ilvl')
+                if list_level is not None:
+                    list_styles[style_id] = list_level.get(f'{W}val')
+                style.clear()
+        for style_id in bold_styles | italic_styles | section_styles.keys() | list_styles.keys():
+            paragraph_styles[style_id] = style_effects(style_id)
+    # collect footnotes, drop those of documents processed before
+    footnote_nodes.clear()
     if footnotes_data:
-        footnote_ids = re.findall(r'<w:footnote(\s[^>]+)?\sw:id="(.*?)"', footnotes_data)
-        for footnote in footnote_ids:
-            footnote_node = re.search(rf'<w:footnote(\s[^>]+)?\sw:id="{re.escape(footnote[1])}"(\s[^>]+)?>.*?<\/w:footnote>', footnotes_data)
-            footnote_nodes[footnote[1]] = f'\\footnote\u007b{process_p_nodes(footnote_node[0], count, True)}\u007d'
+        with footnotes_data:
+            for _, footnote in etree.iterparse(footnotes_data):
+                if footnote.tag != f'{W}footnote':
+                    continue
+                footnote_nodes[footnote.get(f'{W}id')] = f'\\footnote\u007b{process_p_nodes(footnote, count, True)}\u007d'
+                footnote.clear()
     print(f'{len(footnote_nodes)} footnotes found.')
-    # filter body part
-    result = re.search(r'<w:body(\s[^>]+)?>(.*?)<\/w:body>', document_data)[2]
-    result = process_nodes(result, count)
-    # replace footnotes inline
-    if footnote_nodes:
-        result = re.sub(r'<w:footnoteReference(\s[^>]+)?\sw:id="(.*?)"(\s[^>]+)?\/>', lambda m: footnote_nodes.get(m.group(2)), result)
+    # process body part, footnotes are replaced inline
+    # keep one chunk per node, documentation formatting depends on the whole body
+    with document_data:
+        result = list(process_nodes(document_data, count))
     print(f'{count['documentation']} documentations found.')
     print(f'{count['documentation row']} documentation rows found.')
     print(f'{count['bold']} bold found.')
@@ -86,260 +212,257 @@ def process_structure(file_name):
     result_dict = { 'result': result, 'documentation': count['documentation'] > 0 }
     return result_dict
 
-def select_level(level):
-    '''Select hierarchy level of p nodes.'''
-    if level == '0':
-        append_before = '\\section{'
-    elif level == '1':
-        append_before = '\\subsection{'
-    elif level == '2':
-        append_before = '\\subsubsection{'
-    elif level == '3':
-        append_before = '\\paragraph{'
-    else:
-        append_before = '\\subparagraph{'
-    return append_before
-
 # process nodes
-def process_p_nodes(data, count, ignore_footnotes = False):
-    '''Find all w:p nodes in a string and process them accordingly. Consider headers, bold and italic.'''
-    result = ''
-    # process w:p nodes
-    paragraphs = re.findall(r'(<w:p(\s[^>]+)?>.*?<\/w:p>)', data)
-    for p in paragraphs:
-        paragraph = ''
+def process_p_nodes(node, count, ignore_footnotes = False):
+    '''Find all w:p nodes below a node and process them accordingly. Consider headers, bold and italic.'''
+    result = []
+    text_tag = f'{W}t'
+    footnote_tag = None if ignore_footnotes else f'{W}footnoteReference'
+    # process w:p nodes, skip empty ones
+    for p in node.iter(f'{W}p'):
+        if len(p) == 0:
+            continue
         # process node style
-        append_before_p = ''
-        append_after_p = ''
-        p_style = re.search(r'<w:pStyle(\s[^>]+)?\sw:val="(.*?)"', p[0])
-        is_section = False
-        if p_style:
-            if p_style[2] in section_styles:
-                is_section = True
-                append_before_p = select_level(section_styles[p_style[2]])
-                append_after_p = '}'
-                count['section'] += 1
-            if p_style[2] in bold_styles and is_section is False:
-                append_before_p += '\\textbf{'
-                append_after_p += '}'
-                count['bold'] += 1
-            if p_style[2] in italic_styles:
-                append_before_p += '\\emph{'
-                append_after_p += '}'
-                count['italic'] += 1
-            if p_style[2] in list_styles and is_section is False:
-                append_before_p = '<zchinr:item>' + append_before_p
-                append_after_p += '</zchinr:item>'
-                count['list'] += 1
+        p_properties = p.find(f'{W}pPr')
+        p_style = None
+        if p_properties is not None:
+            p_style = p_properties.find(f'{W}pStyle')
+        if p_style is not None:
+            p_style = p_style.get(f'{W}val')
+        append_before_p, append_after_p, is_section, counters = paragraph_styles.get(p_style, _NO_STYLE)
+        for counter in counters:
+            count[counter] += 1
         # process node properties
-        p_properties = re.search(r'<w:pPr(\s[^>]+)?>(.*?)<\/w:pPr>', p[0])
-        if p_properties:
-            if re.search(r'<w:outlineLvl\s.*?\/>', p_properties[2]):
+        if p_properties is not None:
+            level = find_property(p_properties, 'outlineLvl')
+            if level is not None:
                 is_section = True
-                level = re.search(r'<w:outlineLvl(\s[^>]+)?\sw:val="(.*?)"', p_properties[2])
-                append_before_p = select_level(level)
+                level = level.get(f'{W}val', '')
+                append_before_p = _LEVELS[int(level)] if level.isdigit() and int(level) < 4 else _LEVELS[-1]
                 append_after_p = '}'
                 count['section'] += 1
-            if re.search(r'<w:b\/>', p_properties[2]) and is_section is False:
+            if has_property(p_properties, 'b') and is_section is False:
                 append_before_p += '\\textbf{'
                 append_after_p += '}'
                 count['bold'] += 1
-            if re.search(r'<w:i\/>', p_properties[2]):
+            if has_property(p_properties, 'i'):
                 append_before_p += '\\emph{'
                 append_after_p += '}'
                 count['italic'] += 1
-            if re.search(r'<w:ilvl\s.*?\/>', p_properties[2]) and is_section is False:
+            if find_property(p_properties, 'ilvl') is not None and is_section is False:
                 append_before_p = '<zchinr:item>' + append_before_p
                 append_after_p += '</zchinr:item>'
                 count['list'] += 1
         # process w:r nodes
-        runs = re.findall(r'(<w:r(\s[^>]+)?>.*?<\/w:r>)', p[0])
-        for r in runs:
-            run = ''
+        result.append(append_before_p)
+        for r in p.iter(f'{W}r'):
             # process node style
             append_before_r = ''
             append_after_r = ''
-            r_style = re.search(r'<w:r_style(\s[^>]+)?\sw:val="(.*?)"', r[0])
-            if r_style:
-                if r_style[2] in bold_styles and is_section is False:
+            r_properties = r.find(f'{W}rPr')
+            r_style = None
+            if r_properties is not None:
+                r_style = r_properties.find(f'{W}rStyle')
+            if r_style is not None:
+                r_style = r_style.get(f'{W}val')
+                if r_style in bold_styles and is_section is False:
                     append_before_r += '\\textbf{'
                     append_after_r += '}'
                     count['bold'] += 1
-                if r_style[2] in italic_styles:
+                if r_style in italic_styles:
                     append_before_r += '\\emph{'
                     append_after_r += '}'
                     count['italic'] += 1
             # process node properties
-            r_properties = re.search(r'<w:rPr(\s[^>]+)?>(.*?)<\/w:rPr>', r[0])
-            if r_properties:
-                if re.search(r'<w:b\/>', r_properties[2]) and is_section is False:
+            if r_properties is not None:
+                if has_property(r_properties, 'b') and is_section is False:
                     append_before_r += '\\textbf{'
                     append_after_r += '}'
                     count['bold'] += 1
-                if re.search(r'<w:i\/>', r_properties[2]):
+                if has_property(r_properties, 'i'):
                     append_before_r += '\\emph{'
                     append_after_r += '}'
                     count['italic'] += 1
-            # process w:t nodes
-            if ignore_footnotes:
-                texts = re.findall(r'(<w:t(\s[^>]+)?>(.*?)<\/w:t>)', r[0])
-            else:
-                texts = re.findall(r'(<w:t(\s[^>]+)?>(.*?)<\/w:t>|<w:footnoteReference(\s[^>]+)?\/>)', r[0])
-            for t in texts:
-                if re.search(r'<w:t(\s[^>]+)?>.*?<\/w:t>', t[0]):
-                    run += t[2]
-                else:
-                    run += t[0]
-            paragraph += append_before_r + run + append_after_r
-        result += append_before_p + paragraph + append_after_p + '\n\n'
-    return result
+            # process w:t nodes and footnote references
+            result.append(append_before_r)
+            for t in r:
+                if t.tag == text_tag:
+                    result.append(t.text or '')
+                elif t.tag == footnote_tag:
+                    result.append(footnote_nodes.get(t.get(f'{W}id'), ''))
+            result.append(append_after_r)
+        result.append(append_after_p + '\n\n')
+    return ''.join(result)
 
-def process_tbl_nodes(data, count):
-    '''Find all w:tbl nodes in a string and process them accordingly. Output as documentation environment.'''
-    result = ''
-    tables = re.findall(r'(<w:tbl(\s[^>]+)?>.*?<\/w:tbl>)', data)
-    for tbl in tables:
-        result += '\n\n\\begin{documentation}\n'
-        rows = re.findall(r'(<w:tr(\s[^>]+)?>.*?<\/w:tr>)', tbl[0])
-        for tr in rows:
-            cells = re.findall(r'(<w:tc(\s[^>]+)?>.*?<\/w:tc>)', tr[0])
-            result += process_p_nodes(cells[0][0], count)
-            for tc in cells[1:]:
-                result += '<zchinr:cellsep/>' + process_p_nodes(tc[0], count)
-            result += '<zchinr:rowsep/>'
-            count['documentation row'] += 1
-        result += '\\end{documentation}\n\n'
-        count['documentation'] += 1
-    return result
+def process_tbl_nodes(node, count):
+    '''Process a w:tbl node accordingly. Output as documentation environment.'''
+    result = ['\n\n\\begin{documentation}\n']
+    for tr in find_nodes(node, 'tr'):
+        cells = find_nodes(tr, 'tc')
+        if not cells:
+            continue
+        result.append(process_p_nodes(cells[0], count))
+        for tc in cells[1:]:
+            result.append('<zchinr:cellsep/>')
+            result.append(process_p_nodes(tc, count))
+        result.append('<zchinr:rowsep/>')
+        count['documentation row'] += 1
+    result.append('\\end{documentation}\n\n')
+    count['documentation'] += 1
+    return ''.join(result)
 
 def process_nodes(data, count):
-    '''Find all w:p and w:tbl nodes in a string and process them accordingly. Remove empty w:p nodes first.'''
-    result = ''
-    data = re.sub(r'<w:p(\s[^>]+)?\/>', r'', data)
-    nodes = re.findall(r'(<w:tbl(\s[^>]+)?>.*?<\/w:tbl>|<w:p(\s[^>]+)?>.*?<\/w:p>)', data)
-    for node in nodes:
-        if re.search(r'<w:tbl(\s[^>]+)?>.*?<\/w:tbl>', node[0]):
-            result += process_tbl_nodes(node[0], count)
-        else:
-            result += process_p_nodes(node[0], count)
-    return result
-
-def replace_endash(string):
-    '''Replace dashes between numbers, but only if there is only one.'''
-    if len(re.findall(r'\-', string)) > 1:
-        return string
-    return re.sub(r'(\d)\-(\d)', r'\1--\2', string)
+    '''Stream all w:p and w:tbl nodes of a document, process them accordingly and yield the results. Clear processed nodes.'''
+    tbl_depth = 0
+    for event, node in etree.iterparse(data, events=('start', 'end')):
+        if node.tag == f'{W}tbl':
+            if event == 'start':
+                tbl_depth += 1
+                continue
+            tbl_depth -= 1
+            if tbl_depth == 0:
+                yield process_tbl_nodes(node, count)
+                node.clear()
+        elif node.tag == f'{W}p' and event == 'end' and tbl_depth == 0:
+            yield process_p_nodes(node, count)
+            node.clear()
 
 def reduce_emph(string):
     '''Join subsequent emph commands.'''
-    if re.search(r'\\emph\{.*?\}[ \t\f]*\\emph\{.*?\}', string):
-        return reduce_emph(re.sub(r'\\emph\{(.*?)\}([ \t\f]*)\\emph\{(.*?)\}', r'\\emph{\1\2\3}', string))
-    return string
+    return _EMPH_RUN_RE.sub(lambda m: _EMPH_JOIN_RE.sub(r'\1', m.group()), string)
 
 def reduce_textbf(string):
     '''Join subsequent textbf commands.'''
-    if re.search(r'\\textbf\{.*?\}[ \t\f]*\\textbf\{.*?\}', string):
-        return reduce_textbf(re.sub(r'\\textbf\{(.*?)\}([ \t\f]*)\\textbf\{(.*?)\}', r'\\textbf{\1\2\3}', string))
-    return string
+    return _TEXTBF_RUN_RE.sub(lambda m: _TEXTBF_JOIN_RE.sub(r'\1', m.group()), string)
 
-if __name__ == '__main__':
-    file_in = 'input.docx'
-    if sys.argv[1:]:
-        file_in = sys.argv[1]
+def replace_all(string, replacements):
+    '''Replace all fixed substrings one after the other.'''
+    for old, new in replacements.items():
+        string = string.replace(old, new)
+    return string
 
-    # process file data
-    file_return = process_structure(file_in)
-    file_data = file_return.get('result')
+def group_chunks(chunks, size = 65536):
+    '''Join chunks to blocks of a minimum size that can be formatted separately. Never split inside or right after a list, or before blank chunks.'''
+    block = []
+    length = 0
+    in_list = False
+    for chunk in chunks:
+        is_item = chunk.startswith('<zchinr:item>')
+        is_blank = _BLANK_CHUNK_RE.fullmatch(chunk) is not None
+        if length >= size and not in_list and not is_item and not is_blank:
+            yield ''.join(block)
+            block = []
+            length = 0
+        block.append(chunk)
+        length += len(chunk)
+        if not is_blank:
+            in_list = is_item
+    if block:
+        yield ''.join(block)
 
-    # escape ampersand, less than, greater than, number sigh, dollar and percent
-    file_data = re.sub(r'&amp;', '&', file_data)
-    file_data = re.sub(r'&lt;', '<', file_data)
-    file_data = re.sub(r'&gt;', '>', file_data)
-    file_data = re.sub(r'\$', r'\\$', file_data)
-    file_data = re.sub(r'#', r'\\#', file_data)
-    file_data = re.sub(r'&', r'\\&', file_data)
-    file_data = re.sub(r'%', r'\\%', file_data)
+def format_block(string, documentation = False):
+    '''Convert a block of processed nodes to LaTeX.'''
+    # escape dollar, number sign, ampersand and percent
+    string = replace_all(string, _ESCAPES)
 
     # format urls
-    file_data = re.sub(r'<?((www\.[-a-zA-Z\d]+\.[^\s]+\/|http:\/\/|https:\/\/)[^\s>]+)>?', r'\\url{\1}', file_data)
-    file_data = re.sub(r'<([-a-zA-Z\d]+\.([a-z]{2}|com|org|net|info))>', r'\\url{\1}', file_data)
+    string = _URL_RE.sub(r'\\url{\1}', string)
+    string = _URL_DOMAIN_RE.sub(r'\\url{\1}', string)
 
     # tidy up empty, nested and subsequent macros
-    file_data = re.sub(r'\\emph\{\\emph\{(.*?)\}(\s*)\}', r'\\emph{\1\2}', file_data)
-    file_data = re.sub(r'\\textbf\{\\textbf\{(.*?)\}(\s*)\}', r'\\textbf{\1\2}', file_data)
-    file_data = re.sub(r'\\(emph|textbf)\{\\footnote\{(.*?)\}(\s*)\}', r'\\footnote{\2}\3', file_data)
-    file_data = reduce_emph(file_data)
-    file_data = reduce_textbf(file_data)
-    file_data = re.sub(r'\\(emph|textbf)\{\s*\}', '', file_data)
-    file_data = re.sub(r'\\(emph|textbf)\{(.*?)\s+\}', r'\\\1{\2} ', file_data)
-    file_data = re.sub(r'\\(emph|textbf)\{\s+(.*?)\}', r' \\\1{\2}', file_data)
-    file_data = re.sub(r'\\footnote\{(.*?)\s+\}', r'\\footnote{\1}', file_data)
-    file_data = re.sub(r'\\footnote\{\s+(.*?)\}', r'\\footnote{\1}', file_data)
-
-    # replace endash
-    file_data = re.sub(r'[\d\-]+', lambda m: replace_endash(m.group()), file_data)
-    file_data = re.sub(r'\s\-\s', ' -- ', file_data)
+    string = _NESTED_EMPH_RE.sub(r'\\emph{\1\2}', string)
+    string = _NESTED_TEXTBF_RE.sub(r'\\textbf{\1\2}', string)
+    string = _WRAPPED_FOOTNOTE_RE.sub(r'\\footnote{\2}\3', string)
+    string = reduce_emph(string)
+    string = reduce_textbf(string)
+    string = _EMPTY_WRAP_RE.sub('', string)
+    string = _WRAP_TRAILING_SPACE_RE.sub(r'\\\1{\2} ', string)
+    string = _WRAP_LEADING_SPACE_RE.sub(r' \\\1{\2}', string)
+    string = _FOOTNOTE_TRAILING_SPACE_RE.sub(r'\\footnote{\1}', string)
+    string = _FOOTNOTE_LEADING_SPACE_RE.sub(r'\\footnote{\1}', string)
+
+    # replace endash between numbers, but only if there is only one dash
+    string = _ENDASH_RE.sub(r'\1--\2', string)
+    string = _SPACED_DASH_RE.sub(' -- ', string)
 
     # add thin space to abbreviations
-    file_data = re.sub(r'\b([a-zA-Z])\.([a-zA-Z])\.([a-zA-Z])\.', r'\1.\\,\2.\\,\3.', file_data)
-    file_data = re.sub(r'\b([a-zA-Z])\.([a-zA-Z]{1,2})\.', r'\1.\\,\2.', file_data)
-    file_data = re.sub(r'(\d)%', r'\1\\,%', file_data)
+    string = _ABBR_THREE_RE.sub(r'\1.\\,\2.\\,\3.', string)
+    string = _ABBR_TWO_RE.sub(r'\1.\\,\2.', string)
+    string = _NUMBER_PERCENT_RE.sub(r'\1\\,%', string)
 
     # add non-breakable space
-    file_data = re.sub(r'(§§?|Artt?\.|Abs\.|Bd\.|Vol\.|S\.|pp?\.|Nr\.|No\.|Fn\.|Rn\.|Sec\.|sec\.|lit\.)\s(\d+)\s(ff?\.)', r'\1~\2~\3', file_data)
-    file_data = re.sub(r'(§§?|Artt?\.|Abs\.|Bd\.|Vol\.|S\.|pp?\.|Nr\.|No\.|Fn\.|Rn\.|Sec\.|sec\.|lit\.)\s(\d+)', r'\1~\2', file_data)
+    string = _NBSP_RE.sub(lambda m: f'{m[1]}~{m[2]}~{m[3]}' if m[3] else f'{m[1]}~{m[2]}', string)
 
     # replace row and cell separators
-    file_data = re.sub(r'\s+<zchinr:cellsep\/>', r' & \n', file_data)
-    file_data = re.sub(r'\s+<zchinr:rowsep\/>', r' \\\\ \n\n', file_data)
+    string = _CELLSEP_RE.sub(r' & \n', string)
+    string = _ROWSEP_RE.sub(r' \\\\ \n\n', string)
 
     # replace lists with items
-    file_data = re.sub(r'((<zchinr:item>.*?<\/zchinr:item>\s*)+)', r'\\begin{itemize}\n\1\\end{itemize}\n\n', file_data)
-    file_data = re.sub(r'<zchinr:item>(.*?)<\/zchinr:item>\n*', r'\\item \1\n', file_data)
-
-    # process typography
-    file_data = re.sub(r'\u00a0', '~', file_data)
-    file_data = re.sub(r'\u201c\u2018', '``{\kern0pt}`', file_data)
-    file_data = re.sub(r'\u2018\u201c', '`{\kern0pt}``', file_data)
-    file_data = re.sub(r'\u201d\u2019', "''{\kern0pt}'", file_data)
-    file_data = re.sub(r'\u2019\u201d', "'{\kern0pt}''", file_data)
-    file_data = re.sub(r'\u201e\u201a', ',,{\kern0pt},', file_data)
-    file_data = re.sub(r'\u201a\u201e', ',{\kern0pt},,', file_data)
-    file_data = re.sub(r'\u201c', '``', file_data)
-    file_data = re.sub(r'\u201d', "''", file_data)
-    file_data = re.sub(r'\u201e', ',,', file_data)
-    file_data = re.sub(r'\u2018', '`', file_data)
-    file_data = re.sub(r'\u2019', "'", file_data)
-    file_data = re.sub(r'\u201a', ',', file_data)
-    file_data = re.sub(r'\u2026', r'\\ldots{}', file_data)
-    file_data = re.sub(r'\.\.\.', r'\\ldots{}', file_data)
-    file_data = re.sub(r'\u2013', '--', file_data)
-    file_data = re.sub(r'\u2014', '---', file_data)
-    file_data = re.sub(r'!`', '!{}`', file_data)
-    file_data = re.sub(r'\?`', '?{}`', file_data)
+    string = _ITEMS_RE.sub(r'\\begin{itemize}\n\1\\end{itemize}\n\n', string)
+    string = _ITEM_RE.sub(r'\\item \1\n', string)
+
+    # process typography, quote digraphs first
+    string = replace_all(string, _QUOTE_DIGRAPHS)
+    string = replace_all(string, _TYPOGRAPHY)
+    string = _PUNCT_QUOTE_RE.sub(r'\1{}`', string)
 
     # process spaces
-    file_data = re.sub(r'~\n', '\n', file_data)
-    file_data = re.sub(r'\n{3,}', '\n\n', file_data)
-    file_data = re.sub(r'~[ \t\f]', '~', file_data)
-    file_data = re.sub(r'[ \t\f]~', '~', file_data)
+    string = _TILDE_NEWLINE_RE.sub('\n', string)
+    string = _NEWLINES_RE.sub('\n\n', string)
+    string = _TILDE_SPACE_RE.sub('~', string)
+    string = _SPACE_TILDE_RE.sub('~', string)
 
     # process chinese characters
-    file_data = re.sub(r'([\u3000-\u303F\u4e00-\u9fff\uFF00-\uFFEF]+)', r'\\zhs{\1}', file_data)
+    string = _CJK_RE.sub(r'\\zhs{\1}', string)
 
     # footnote references
     # currently not supported
 
     # format documentation
-    if file_return.get('documentation'):
+    if documentation:
+        string = _DOC_TEXTBF_RE.sub(r'\1', string)
+        string = _DOC_ARTICLE_RE.sub(r'\\zhs{\\textbf' + '{\u7b2c' + r'\1' + '\u6761}\u3000', string)
+        string = _DOC_PARAGRAPH_RE.sub(r'\\textbf{§~\1 [\2]} ', string)
+        string = _NEWLINES_RE.sub('\n\n', string)
+    return string
+
+def format_blocks(chunks, documentation = False):
+    '''Format chunks block by block. Use parallel processes for long documents.'''
+    blocks = group_chunks(chunks)
+    if (os.cpu_count() or 1) < 2 or sum(map(len, chunks)) < _PARALLEL_SIZE:
+        for block in blocks:
+            yield format_block(block, documentation)
+        return
+    with ProcessPoolExecutor() as executor:
+        yield from executor.map(format_block, blocks, itertools.repeat(documentation))
+
+def write_block(file, string, newlines = 0):
+    '''Write a block to a file. Reduce more than two line breaks across blocks and return the number of trailing line breaks.'''
+    text = string.lstrip('\n')
+    leading = len(string) - len(text)
+    if newlines + leading > 2:
+        leading = max(0, 2 - newlines)
+    file.write('\n' * leading + text)
+    if not text:
+        return newlines + leading
+    return len(text) - len(text.rstrip('\n'))
+
+if __name__ == '__main__':
+    file_in = 'input.docx'
+    if sys.argv[1:]:
+        file_in = sys.argv[1]
+
+    # process file data
+    file_return = process_structure(file_in)
+    documentation = file_return.get('documentation')
+    if documentation:
         print('Format documentation.')
-        file_data = re.sub(r'^\\textbf\{(.*?)\}', r'\1', file_data, flags=re.M)
-        file_data = re.sub(r'^\\zhs\{\u7b2c(.*)\u6761[\u3000\s]', r'\\zhs{\\textbf' + '{\u7b2c' + r'\1' + '\u6761}\u3000', file_data, flags=re.M)
-        file_data = re.sub(r'^§~(\d+)\s\[(.*?)\]\s', r'\\textbf{§~\1 [\2]} ', file_data, flags=re.M)
 
-    # write file
+    # write file block by block
     file_out = 'output.tex'
     if sys.argv[2:]:
         file_out = sys.argv[2]
     with open(file_out, 'w', encoding='utf-8') as file:
-        file.write(file_data)
+        newlines = 0
+        for block in format_blocks(file_return.get('result'), documentation):
+            newlines = write_block(file, block, newlines)
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
 # File: fn2txt.py
-# Version: 1.0 2025-05-13
-# Copyright 2024-2025 Jasper Habicht (mail(at)jasperhabicht.de).
+# Version: 1.1 2026-10-14
+# Copyright 2024-2026 Jasper Habicht (mail(at)jasperhabicht.de).
 #
 # This work may be distributed and/or modified under the
 # conditions of the LaTeX Project Public License version 1.3c,
@@ -17,7 +17,22 @@
 import re
 import sys
 
-out_txt = ''
+_MACRO_RE = re.compile(r'\\(zhs|emph|textbf)\{(.*?)\}')
+_URL_RE = re.compile(r'\\url\{(.*?)\}')
+_FOOTNOTE_RE = re.compile(r'\\footnote\{([^\}]+?)\}')
+_SPACES = {
+    '\\,': ' ',
+    '~': ' '
+}
+_TYPOGRAPHY = {
+    '---': '\u2014',
+    '--': '\u2013',
+    "''": '\u201D',
+    "'": '\u2019',
+    '``': '\u201C',
+    '`': '\u2018',
+    ',,': '\u201E'
+}
 
 if __name__ == '__main__':
     file_in = 'input.tex'
@@ -27,26 +42,19 @@ if __name__ == '__main__':
     with open(file_in, 'r', encoding='utf-8') as f:
         file_data = f.read()
 
-    file_data = re.sub(r'\\(zhs|emph|textbf)\{(.*?)\}', r'\2', file_data)
-    file_data = re.sub(r'\\url\{(.*?)\}', r'<\1>', file_data)
-    file_data = re.sub(r'(\\,|~)', r' ', file_data)
+    file_data = _MACRO_RE.sub(r'\2', file_data)
+    file_data = _URL_RE.sub(r'<\1>', file_data)
+    for old, new in _SPACES.items():
+        file_data = file_data.replace(old, new)
 
-    file_data = re.sub(r'---', '\u2014', file_data)
-    file_data = re.sub(r'--', '\u2013', file_data)
-    file_data = re.sub(r"''", '\u201D', file_data)
-    file_data = re.sub(r"'", '\u2019', file_data)
-    file_data = re.sub(r'``', '\u201C', file_data)
-    file_data = re.sub(r'`', '\u2018', file_data)
-    file_data = re.sub(r',,', '\u201E', file_data)
+    for old, new in _TYPOGRAPHY.items():
+        file_data = file_data.replace(old, new)
 
-    list_fns = re.findall(r'\\footnote\{([^\}]+?)\}', file_data)
-
-    for fn in list_fns:
-        out_txt += str(fn) + '\n\n'
+    list_fns = _FOOTNOTE_RE.findall(file_data)
 
     # write file
     file_out = 'output.txt'
     if len(sys.argv) > 2:
         file_out = sys.argv[2]
     with open(file_out, 'w', encoding='utf-8') as file:
-        file.write(out_txt)
+        file.write(''.join(fn + '\n\n' for fn in list_fns))